@@ -1,19 +1,30 @@
 #!/usr/bin/env python3
 """
 PAXG 黄金套利监控系统
-从币安获取 PAXG 合约数据，每分钟更新一次，输出到多个 JSONL 文件
+从币安获取 PAXG 合约数据，每分钟更新一次，输出到 JSONL 文件
 """
 
 import asyncio
-import aiohttp
-import json
+import atexit
+import contextlib
+import httpx
 import logging
+import numpy as np
+import orjson
 import sys
+import threading
 import time
-from datetime import datetime, timezone
-from decimal import Decimal
+import websockets
+import zstandard
+from dataclasses import dataclass, field
 from pathlib import Path
 
+try:
+    # libuv 事件循环，可选依赖（Windows 不支持）
+    import uvloop
+except ImportError:
+    uvloop = None
+
 
 def setup_logger(name: str = "paxg_monitor", log_file: str = None) -> logging.Logger:
     """配置日志器"""
@@ -51,16 +62,26 @@ class BinanceAPI:
 
     SPOT_BASE_URL = "https://api.binance.com"
     FUTURES_BASE_URL = "https://fapi.binance.com"
+    FUTURES_STREAM_URL = "wss://fstream.binance.com/stream"
 
-    def __init__(self, session: aiohttp.ClientSession):
+    def __init__(self, session: httpx.AsyncClient):
         self.session = session
 
+    @staticmethod
+    def create_session() -> httpx.AsyncClient:
+        """创建 HTTP/2 会话，所有并发请求复用同一条 TCP/TLS 连接"""
+        limits = httpx.Limits(max_connections=4, max_keepalive_connections=4, keepalive_expiry=75)
+        return httpx.AsyncClient(http2=True, limits=limits, timeout=10)
+
+    async def fetch(self, url: str, params: dict = None) -> dict | list:
+        """请求完整 URL，供预先构造好 (url, params) 的调用方使用"""
+        response = await self.session.get(url, params=params)
+        response.raise_for_status()
+        return response.json()
+
     async def _request(self, base_url: str, endpoint: str, params: dict = None) -> dict | list:
         """发送 API 请求"""
-        url = f"{base_url}{endpoint}"
-        async with self.session.get(url, params=params) as response:
-            response.raise_for_status()
-            return await response.json()
+        return await self.fetch(f"{base_url}{endpoint}", params)
 
     async def get_futures_ticker(self, symbol: str) -> dict:
         """获取合约 24hr ticker - /fapi/v1/ticker/24hr"""
@@ -127,6 +148,31 @@ class BinanceAPI:
         )
 
 
+def _vwap(levels: list, target_quantity: float) -> tuple[float, bool]:
+    """
+    计算吃掉 target_quantity 数量时的加权平均价
+
+    Returns:
+        tuple: (加权平均价, 订单薄数量是否足够 target_quantity)，订单薄为空时返回 (0, False)
+    """
+    if not levels:
+        return 0.0, False
+
+    arr = np.asarray(levels, dtype=np.float64)
+    prices, qtys = arr[:, 0], arr[:, 1]
+
+    # 每档实际成交量 = min(该档数量, 剩余目标数量)
+    cum_qtys = np.cumsum(qtys)
+    remaining = np.maximum(target_quantity - (cum_qtys - qtys), 0.0)
+    filled = np.minimum(qtys, remaining)
+    filled_sum = filled.sum()
+    is_filled = bool(cum_qtys[-1] >= target_quantity)
+
+    if filled_sum <= 0:
+        return 0.0, is_filled
+    return float(prices @ filled / filled_sum), is_filled
+
+
 def calculate_orderbook_spread(orderbook: dict, target_quantity: float) -> dict:
     """
     计算订单薄累计指定数量的 spread
@@ -136,66 +182,162 @@ def calculate_orderbook_spread(orderbook: dict, target_quantity: float) -> dict:
         target_quantity: 目标数量（盎司）
 
     Returns:
-        dict: 包含 bid_price, ask_price, spread, mid_price
+        dict: 包含 bid_price, ask_price, spread, mid_price，
+              以及 filled（bid 和 ask 两侧是否都够 target_quantity，不够说明订单薄深度不足）
     """
-    bids = orderbook.get("bids", [])
-    asks = orderbook.get("asks", [])
+    # 计算累计 target_quantity 盎司的加权平均买价 / 卖价
+    bid_avg_price, bid_filled = _vwap(orderbook.get("bids", []), target_quantity)
+    ask_avg_price, ask_filled = _vwap(orderbook.get("asks", []), target_quantity)
 
-    # 计算累计 target_quantity 盎司的加权平均买价
-    bid_qty_sum = Decimal("0")
-    bid_value_sum = Decimal("0")
-    bid_avg_price = Decimal("0")
+    # 计算 spread
+    spread = ask_avg_price - bid_avg_price if ask_avg_price and bid_avg_price else 0.0
+    mid_price = (ask_avg_price + bid_avg_price) / 2 if ask_avg_price and bid_avg_price else 0.0
+
+    return {
+        "bid_price": bid_avg_price,
+        "ask_price": ask_avg_price,
+        "spread": spread,
+        "mid_price": mid_price,
+        "filled": bid_filled and ask_filled,
+    }
 
-    for price, qty in bids:
-        price = Decimal(str(price))
-        qty = Decimal(str(qty))
-        remaining = Decimal(str(target_quantity)) - bid_qty_sum
 
-        if remaining <= 0:
-            break
+# 各类记录的结构，字段顺序即输出 JSON 的键顺序，type 与原先的文件名一致
+
+@dataclass(slots=True)
+class PriceRecord:
+    """price 记录"""
+    type: str = field(default="price", init=False)
+    timestamp: int
+    price: float
+    mid_price: float
+
+
+@dataclass(slots=True)
+class BasisRateRecord:
+    """basisRate 记录"""
+    type: str = field(default="basisRate", init=False)
+    indexPrice: str
+    contractType: str
+    basisRate: str
+    futuresPrice: str
+    annualizedBasisRate: str
+    basis: str
+    pair: str
+    timestamp: int
+
+
+@dataclass(slots=True)
+class OpenInterestRecord:
+    """openinterest 记录"""
+    type: str = field(default="openinterest", init=False)
+    symbol: str
+    sumOpenInterest: str
+    sumOpenInterestValue: str
+    timestamp: int
+
+
+@dataclass(slots=True)
+class FundingRateRecord:
+    """fundingRate 记录"""
+    type: str = field(default="fundingRate", init=False)
+    symbol: str
+    fundingRate: str
+    timestamp: int
+
+
+@dataclass(slots=True)
+class Volume24hRecord:
+    """volume_24h 记录"""
+    type: str = field(default="volume_24h", init=False)
+    symbol: str
+    volume: str
+    quoteVolume: str
+    timestamp: int
+
+
+@dataclass(slots=True)
+class SpreadRecord:
+    """spread 记录"""
+    type: str = field(default="spread", init=False)
+    symbol: str
+    spread: float
+    timestamp: int
+
+
+def derive_basis(premium: dict) -> dict:
+    """
+    由 premiumIndex 推算基差，字段与 /futures/data/basis 保持一致
 
-        fill_qty = min(qty, remaining)
-        bid_qty_sum += fill_qty
-        bid_value_sum += fill_qty * price
+    Args:
+        premium: premiumIndex 数据，需包含 markPrice 和 indexPrice
 
-    if bid_qty_sum > 0:
-        bid_avg_price = bid_value_sum / bid_qty_sum
+    Returns:
+        dict: 包含 indexPrice, futuresPrice, basis, basisRate, timestamp；数据缺失时返回空 dict
+    """
+    mark_price = float(premium.get("markPrice") or 0)
+    index_price = float(premium.get("indexPrice") or 0)
+    if not mark_price or not index_price:
+        return {}
 
-    # 计算累计 target_quantity 盎司的加权平均卖价
-    ask_qty_sum = Decimal("0")
-    ask_value_sum = Decimal("0")
-    ask_avg_price = Decimal("0")
+    basis = mark_price - index_price
+    return {
+        "indexPrice": premium["indexPrice"],
+        "futuresPrice": premium["markPrice"],
+        "basis": f"{basis:.8f}",
+        "basisRate": f"{basis / index_price:.8f}",
+        "timestamp": premium.get("time"),
+    }
 
-    for price, qty in asks:
-        price = Decimal(str(price))
-        qty = Decimal(str(qty))
-        remaining = Decimal(str(target_quantity)) - ask_qty_sum
 
-        if remaining <= 0:
-            break
+def ticker_from_stream(event: dict) -> dict:
+    """将 <symbol>@ticker 推送转换为 /fapi/v1/ticker/24hr 的字段"""
+    return {"lastPrice": event["c"], "volume": event["v"], "quoteVolume": event["q"]}
 
-        fill_qty = min(qty, remaining)
-        ask_qty_sum += fill_qty
-        ask_value_sum += fill_qty * price
 
-    if ask_qty_sum > 0:
-        ask_avg_price = ask_value_sum / ask_qty_sum
+def orderbook_from_stream(event: dict) -> dict:
+    """将 <symbol>@depth20 推送转换为 /fapi/v1/depth 的字段"""
+    return {"bids": event["b"], "asks": event["a"]}
 
-    # 计算 spread
-    spread = ask_avg_price - bid_avg_price if ask_avg_price and bid_avg_price else Decimal("0")
-    mid_price = (ask_avg_price + bid_avg_price) / 2 if ask_avg_price and bid_avg_price else Decimal("0")
 
+def premium_from_stream(event: dict) -> dict:
+    """将 <symbol>@markPrice 推送转换为 /fapi/v1/premiumIndex 的字段"""
     return {
-        "bid_price": float(bid_avg_price),
-        "ask_price": float(ask_avg_price),
-        "spread": float(spread),
-        "mid_price": float(mid_price),
+        "markPrice": event["p"],
+        "indexPrice": event["i"],
+        "lastFundingRate": event["r"],
+        "time": event["E"],
     }
 
 
+def compress_file(path: Path, level: int = 3) -> Path:
+    """用 zstd 压缩文件为 <name>.zst，完成后删除原文件；目标已存在时不覆盖"""
+    target = path.with_name(path.name + ".zst")
+    tmp = target.with_name(target.name + ".tmp")
+    if target.exists():
+        raise FileExistsError(f"{target} already exists")
+
+    compressor = zstandard.ZstdCompressor(level=level)
+    with open(path, "rb") as src, open(tmp, "wb") as dst:
+        compressor.copy_stream(src, dst)
+
+    # 写完再改名，避免留下不完整的 .zst
+    tmp.replace(target)
+    path.unlink()
+    return target
+
+
 class PAXGMonitor:
     """PAXG 套利监控器"""
 
+    # 单个 JSONL 文件超过该大小后轮转并压缩
+    ROTATE_BYTES = 10 * 1024 * 1024
+    # websocket 推送数据的最长有效时间（秒），超过则回退到 REST 请求
+    STREAM_MAX_AGE = 10
+    # 订单薄默认只取前几档，不够 target_oz 时再取完整深度
+    ORDERBOOK_LIMIT = 10
+    ORDERBOOK_FULL_LIMIT = 100
+
     def __init__(self, output_dir: str = "binance/paxg-future", target_oz: float = 2.0):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
@@ -203,29 +345,87 @@ class PAXGMonitor:
         self.symbol = "PAXGUSDT"
         self.pair = "PAXGUSDT"
 
-        # 定义输出文件
-        self.files = {
-            "price": self.output_dir / "price.jsonl",
-            "basisRate": self.output_dir / "basisRate.jsonl",
-            "openinterest": self.output_dir / "openinterest.jsonl",
-            "fundingRate": self.output_dir / "fundingRate.jsonl",
-            "volume_24h": self.output_dir / "volume_24h.jsonl",
-            "spread": self.output_dir / "spread.jsonl",
+        # 所有记录写入同一个文件，用 type 字段区分（可用 split_by_type.py 拆回各自文件）
+        self.events_file = self.output_dir / "events.jsonl"
+
+        # 常驻的追加写句柄，避免每条记录都 open/close
+        self.handle = open(self.events_file, "ab")
+        # 本周期待写入的行，在 _flush_all 中统一写入
+        self._pending = []
+        # 每种 type 最近写入的一行，供 --once 打印摘要，无需回读文件
+        self.last_lines = {}
+        atexit.register(self.close)
+
+        # 记录构造函数，按写入顺序排列
+        self._builders = (
+            self._build_price,
+            self._build_basis_rate,
+            self._build_open_interest,
+            self._build_funding_rate,
+            self._build_volume,
+            self._build_spread,
+        )
+
+        # 每个周期请求的接口，symbol 固定，(url, params) 只构造一次
+        # 收盘价取自 ticker.lastPrice，资金费率取自 premiumIndex，不再单独请求 klines / fundingRate
+        base_url = BinanceAPI.FUTURES_BASE_URL
+        self._endpoints = {
+            "ticker": (f"{base_url}/fapi/v1/ticker/24hr", {"symbol": self.symbol}),
+            "orderbook": (f"{base_url}/fapi/v1/depth", {"symbol": self.symbol, "limit": self.ORDERBOOK_LIMIT}),
+            "basis": (
+                f"{base_url}/futures/data/basis",
+                {"pair": self.pair, "contractType": "PERPETUAL", "period": "5m", "limit": 1},
+            ),
+            "open_interest_hist": (
+                f"{base_url}/futures/data/openInterestHist",
+                {"symbol": self.symbol, "period": "5m", "limit": 1},
+            ),
+            "premium_index": (f"{base_url}/fapi/v1/premiumIndex", {"symbol": self.symbol}),
+        }
+
+        # ticker / 订单薄 / 标记价格通过 websocket 推送，basis 和持仓量只有 REST 接口
+        stream_symbol = self.symbol.lower()
+        self._streams = {
+            f"{stream_symbol}@ticker": ("ticker", ticker_from_stream),
+            f"{stream_symbol}@depth20@100ms": ("orderbook", orderbook_from_stream),
+            f"{stream_symbol}@markPrice@1s": ("premium_index", premium_from_stream),
         }
+        self._stream_url = f"{BinanceAPI.FUTURES_STREAM_URL}?streams={'/'.join(self._streams)}"
+        # 最新推送数据 {name: (接收时间 monotonic, data)}
+        self._latest = {}
+
+        # HTTP 会话在首次采集时创建，之后所有采集共用
+        self._session = None
+        self._api = None
+
+    def _get_api(self) -> BinanceAPI:
+        """获取共用的 API 客户端，必要时创建会话"""
+        if self._session is None or self._session.is_closed:
+            self._session = BinanceAPI.create_session()
+            self._api = BinanceAPI(self._session)
+        return self._api
+
+    async def close_session(self):
+        """关闭共用的 HTTP 会话"""
+        if self._session is not None and not self._session.is_closed:
+            await self._session.aclose()
+        self._session = None
+        self._api = None
 
     async def fetch_all_data(self, api: BinanceAPI) -> dict:
-        """并发获取所有数据"""
+        """并发获取所有数据，websocket 推送的最新数据优先，缺失或过期的再走 REST"""
+        now = time.monotonic()
+        results = {
+            name: data
+            for name, (received, data) in self._latest.items()
+            if now - received <= self.STREAM_MAX_AGE
+        }
         tasks = {
-            "ticker": api.get_futures_ticker(self.symbol),
-            "orderbook": api.get_futures_orderbook(self.symbol, limit=100),
-            "kline": api.get_futures_kline(self.symbol),
-            "basis": api.get_basis(self.pair),
-            "open_interest_hist": api.get_open_interest_hist(self.symbol),
-            "funding_rate": api.get_funding_rate(self.symbol),
-            "premium_index": api.get_premium_index(self.symbol),
+            name: api.fetch(url, params)
+            for name, (url, params) in self._endpoints.items()
+            if name not in results
         }
 
-        results = {}
         gathered = await asyncio.gather(*tasks.values(), return_exceptions=True)
 
         for key, result in zip(tasks.keys(), gathered):
@@ -235,162 +435,211 @@ class PAXGMonitor:
             else:
                 results[key] = result
 
+        # 计算 spread 时发现浅订单薄不够吃满 target_oz，改用完整深度重新请求
+        orderbook = results.get("orderbook")
+        if orderbook:
+            spread_info = calculate_orderbook_spread(orderbook, self.target_oz)
+            if not spread_info["filled"]:
+                logger.warning(f"Orderbook depth below {self.target_oz} oz, refetching with limit={self.ORDERBOOK_FULL_LIMIT}")
+                url, params = self._endpoints["orderbook"]
+                try:
+                    results["orderbook"] = await api.fetch(url, {**params, "limit": self.ORDERBOOK_FULL_LIMIT})
+                    spread_info = calculate_orderbook_spread(results["orderbook"], self.target_oz)
+                except Exception as e:
+                    logger.warning(f"Error fetching orderbook: {e}")
+            # 结果随数据一起返回，process_and_write 不再重复计算
+            results["spread_info"] = spread_info
+
         return results
 
-    def process_and_write(self, raw_data: dict):
-        """处理数据并写入各个文件"""
-        timestamp = int(time.time() * 1000)
+    def process_and_write(self, raw_data: dict, timestamp: int = None):
+        """处理数据并写入事件文件，timestamp 为毫秒时间戳，默认取当前时间"""
+        if timestamp is None:
+            timestamp = int(time.time() * 1000)
 
-        # 1. price.jsonl
-        self._write_price(raw_data, timestamp)
+        # 订单薄 spread 每个周期只计算一次，price 和 spread 共用；fetch_all_data 已算过时直接复用
+        spread_info = raw_data.get("spread_info") or calculate_orderbook_spread(
+            raw_data.get("orderbook") or {}, self.target_oz
+        )
 
-        # 2. basisRate.jsonl
-        self._write_basis_rate(raw_data, timestamp)
+        # 依次构造 price / basisRate / openinterest / fundingRate / volume_24h / spread 记录
+        append = self._append_jsonl
+        for build in self._builders:
+            append(build(raw_data, timestamp, spread_info))
 
-        # 3. openinterest.jsonl
-        self._write_open_interest(raw_data, timestamp)
+        self._flush_all()
 
-        # 4. fundingRate.jsonl
-        self._write_funding_rate(raw_data, timestamp)
+    @staticmethod
+    def _first(items: list | None):
+        """返回列表的第一个元素，列表为空或缺失时返回 None"""
+        return items[0] if items else None
 
-        # 5. volume_24h.jsonl
-        self._write_volume(raw_data, timestamp)
+    def _build_price(self, raw_data: dict, timestamp: int, spread_info: dict) -> PriceRecord:
+        """构造价格记录"""
+        ticker = raw_data.get("ticker") or {}
 
-        # 6. spread.jsonl
-        self._write_spread(raw_data, timestamp)
+        # 当前分钟 K 线的收盘价即最新成交价
+        last_price = ticker.get("lastPrice")
+        close_price = float(last_price) if last_price else 0.0
+
+        return PriceRecord(timestamp, close_price, spread_info["mid_price"])
+
+    def _build_basis_rate(self, raw_data: dict, timestamp: int, spread_info: dict) -> BasisRateRecord:
+        """构造基差记录"""
+        # basis 接口没数据时用 premiumIndex 本地推算，两者都没有则各字段使用空值
+        basis = self._first(raw_data.get("basis")) or derive_basis(raw_data.get("premium_index") or {})
+
+        return BasisRateRecord(
+            indexPrice=basis.get("indexPrice", ""),
+            contractType=basis.get("contractType", "PERPETUAL"),
+            basisRate=basis.get("basisRate", ""),
+            futuresPrice=basis.get("futuresPrice", ""),
+            annualizedBasisRate=basis.get("annualizedBasisRate", ""),
+            basis=basis.get("basis", ""),
+            pair=self.pair,
+            timestamp=basis.get("timestamp") or timestamp,
+        )
 
-    def _write_price(self, raw_data: dict, timestamp: int):
-        """写入价格数据"""
-        kline = raw_data.get("kline") or [[]]
-        orderbook = raw_data.get("orderbook") or {}
+    def _build_open_interest(self, raw_data: dict, timestamp: int, spread_info: dict) -> OpenInterestRecord:
+        """构造持仓量记录"""
+        oi = self._first(raw_data.get("open_interest_hist")) or {}
 
-        close_price = float(kline[0][4]) if kline and len(kline[0]) > 4 else 0
-        spread_info = calculate_orderbook_spread(orderbook, self.target_oz)
+        return OpenInterestRecord(
+            symbol=self.symbol,
+            sumOpenInterest=oi.get("sumOpenInterest", ""),
+            sumOpenInterestValue=oi.get("sumOpenInterestValue", ""),
+            timestamp=oi.get("timestamp", timestamp),
+        )
 
-        data = {
-            "timestamp": timestamp,
-            "price": close_price,
-            "mid_price": spread_info["mid_price"],
-        }
-        self._append_jsonl(self.files["price"], data)
-
-    def _write_basis_rate(self, raw_data: dict, timestamp: int):
-        """写入基差数据"""
-        basis_list = raw_data.get("basis") or []
-
-        if basis_list and len(basis_list) > 0:
-            basis = basis_list[0]
-            data = {
-                "indexPrice": basis.get("indexPrice", ""),
-                "contractType": basis.get("contractType", "PERPETUAL"),
-                "basisRate": basis.get("basisRate", ""),
-                "futuresPrice": basis.get("futuresPrice", ""),
-                "annualizedBasisRate": basis.get("annualizedBasisRate", ""),
-                "basis": basis.get("basis", ""),
-                "pair": self.pair,
-                "timestamp": basis.get("timestamp", timestamp),
-            }
-        else:
-            # 如果接口没数据，使用空值
-            data = {
-                "indexPrice": "",
-                "contractType": "PERPETUAL",
-                "basisRate": "",
-                "futuresPrice": "",
-                "annualizedBasisRate": "",
-                "basis": "",
-                "pair": self.pair,
-                "timestamp": timestamp,
-            }
-        self._append_jsonl(self.files["basisRate"], data)
-
-    def _write_open_interest(self, raw_data: dict, timestamp: int):
-        """写入持仓量数据"""
-        oi_list = raw_data.get("open_interest_hist") or []
-
-        if oi_list and len(oi_list) > 0:
-            oi = oi_list[0]
-            data = {
-                "symbol": self.symbol,
-                "sumOpenInterest": oi.get("sumOpenInterest", ""),
-                "sumOpenInterestValue": oi.get("sumOpenInterestValue", ""),
-                "timestamp": oi.get("timestamp", timestamp),
-            }
-        else:
-            data = {
-                "symbol": self.symbol,
-                "sumOpenInterest": "",
-                "sumOpenInterestValue": "",
-                "timestamp": timestamp,
-            }
-        self._append_jsonl(self.files["openinterest"], data)
-
-    def _write_funding_rate(self, raw_data: dict, timestamp: int):
-        """写入资金费率数据"""
-        funding_list = raw_data.get("funding_rate") or []
+    def _build_funding_rate(self, raw_data: dict, timestamp: int, spread_info: dict) -> FundingRateRecord:
+        """构造资金费率记录"""
         premium = raw_data.get("premium_index") or {}
 
-        # 优先使用 premiumIndex 的实时资金费率
-        funding_rate = premium.get("lastFundingRate", "")
-
-        if not funding_rate and funding_list:
-            funding_rate = funding_list[0].get("fundingRate", "")
-
-        data = {
-            "symbol": self.symbol,
-            "fundingRate": funding_rate,
-            "timestamp": timestamp,
-        }
-        self._append_jsonl(self.files["fundingRate"], data)
+        # premiumIndex 的实时资金费率
+        return FundingRateRecord(self.symbol, premium.get("lastFundingRate", ""), timestamp)
 
-    def _write_volume(self, raw_data: dict, timestamp: int):
-        """写入24小时成交量数据"""
+    def _build_volume(self, raw_data: dict, timestamp: int, spread_info: dict) -> Volume24hRecord:
+        """构造24小时成交量记录"""
         ticker = raw_data.get("ticker") or {}
 
-        data = {
-            "symbol": self.symbol,
-            "volume": ticker.get("volume", ""),
-            "quoteVolume": ticker.get("quoteVolume", ""),
-            "timestamp": timestamp,
-        }
-        self._append_jsonl(self.files["volume_24h"], data)
-
-    def _write_spread(self, raw_data: dict, timestamp: int):
-        """写入 spread 数据"""
-        orderbook = raw_data.get("orderbook") or {}
-        spread_info = calculate_orderbook_spread(orderbook, self.target_oz)
-
-        data = {
-            "symbol": self.symbol,
-            "spread": spread_info["spread"],
-            "timestamp": timestamp,
-        }
-        self._append_jsonl(self.files["spread"], data)
-
-    def _append_jsonl(self, filepath: Path, data: dict):
-        """追加写入 JSONL 文件"""
-        with open(filepath, "a", encoding="utf-8") as f:
-            f.write(json.dumps(data, ensure_ascii=False) + "\n")
+        return Volume24hRecord(self.symbol, ticker.get("volume", ""), ticker.get("quoteVolume", ""), timestamp)
+
+    def _build_spread(self, raw_data: dict, timestamp: int, spread_info: dict) -> SpreadRecord:
+        """构造 spread 记录"""
+        return SpreadRecord(self.symbol, spread_info["spread"], timestamp)
+
+    def _append_jsonl(self, record):
+        """追加一行到 JSONL 写入缓冲，orjson 直接序列化 dataclass 记录"""
+        line = orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+        self._pending.append(line)
+        self.last_lines[record.type] = line
+
+    def _flush_all(self):
+        """将缓冲的行写入事件文件并刷新"""
+        if self._pending:
+            self.handle.write(b"".join(self._pending))
+            self._pending.clear()
+        self.handle.flush()
+
+        # 追加模式下 tell() 即文件大小，不需要额外 stat
+        if self.handle.tell() > self.ROTATE_BYTES:
+            self._rotate()
+
+    def _rotate(self):
+        """轮转文件：改名当前文件并打开新文件，成功后才替换并关闭旧句柄，再后台压缩"""
+        path = self.events_file
+        rotated = self._rotated_path()
+
+        # 任何一步失败都保留旧句柄继续追加，下个周期再尝试轮转
+        try:
+            path.rename(rotated)
+        except OSError as e:
+            logger.error(f"Error rotating {path.name}: {e}, keep appending to current file")
+            return
+        try:
+            handle = open(path, "ab")
+        except OSError as e:
+            logger.error(f"Error reopening {path.name}: {e}, keep appending to current file")
+            try:
+                rotated.rename(path)
+            except OSError as e:
+                logger.error(f"Error restoring {path.name} from {rotated.name}: {e}")
+            return
+
+        old_handle, self.handle = self.handle, handle
+        old_handle.close()
+        logger.info(f"Rotated {path.name} -> {rotated.name}")
+
+        threading.Thread(target=self._compress_rotated, args=(rotated,), name="compress-events").start()
+
+    def _rotated_path(self) -> Path:
+        """
+        生成轮转文件名 events.<UTC 时间>.jsonl，同一秒内多次轮转时追加 -1、-2 ...
+
+        使用 UTC 避免夏令时回拨造成重名，且不会与已有的 .jsonl 或 .jsonl.zst 重名
+        """
+        path = self.events_file
+        stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        rotated = path.with_name(f"{path.stem}.{stamp}{path.suffix}")
+
+        counter = 0
+        while rotated.exists() or rotated.with_name(rotated.name + ".zst").exists():
+            counter += 1
+            rotated = path.with_name(f"{path.stem}.{stamp}-{counter}{path.suffix}")
+        return rotated
+
+    @staticmethod
+    def _compress_rotated(path: Path):
+        """后台线程中压缩已轮转的文件"""
+        try:
+            target = compress_file(path)
+            logger.info(f"Compressed {path.name} -> {target.name}")
+        except Exception as e:
+            logger.error(f"Error compressing {path}: {e}", exc_info=True)
+
+    def close(self):
+        """刷新并关闭输出文件"""
+        if not self.handle.closed:
+            self.handle.writelines(self._pending)
+            self._pending.clear()
+            self.handle.close()
+
+    async def _consume_stream(self):
+        """订阅 websocket 行情并持续更新 self._latest，断线后自动重连"""
+        while True:
+            try:
+                async with websockets.connect(self._stream_url) as ws:
+                    logger.info(f"Stream connected: {', '.join(self._streams)}")
+                    async for message in ws:
+                        msg = orjson.loads(message)
+                        stream = self._streams.get(msg.get("stream"))
+                        if stream is not None:
+                            name, convert = stream
+                            self._latest[name] = (time.monotonic(), convert(msg["data"]))
+            except Exception as e:
+                logger.warning(f"Stream disconnected: {e}, reconnecting in 5s")
+            await asyncio.sleep(5)
 
     async def run_once(self):
         """运行一次数据采集"""
-        async with aiohttp.ClientSession() as session:
-            api = BinanceAPI(session)
-            raw_data = await self.fetch_all_data(api)
-            self.process_and_write(raw_data)
-            return raw_data
+        raw_data = await self.fetch_all_data(self._get_api())
+        self.process_and_write(raw_data)
+        return raw_data
 
     async def run_forever(self, interval_seconds: int = 60):
         """持续运行，每分钟采集一次"""
         logger.info(f"Starting PAXG monitor")
         logger.info(f"Symbol: {self.symbol} | Interval: {interval_seconds}s | Spread target: {self.target_oz} oz")
         logger.info(f"Output directory: {self.output_dir}")
-        logger.info(f"Output files: {', '.join(self.files.keys())}")
+        logger.info(f"Output file: {self.events_file.name}")
         logger.info("-" * 60)
 
-        async with aiohttp.ClientSession() as session:
-            api = BinanceAPI(session)
+        stream_task = asyncio.create_task(self._consume_stream())
+        try:
+            api = self._get_api()
             cycle_count = 0
+            # 按绝对截止时间调度，单个周期变慢不会让之后的采集时间持续漂移
+            next_deadline = time.monotonic()
 
             while True:
                 try:
@@ -399,14 +648,13 @@ class PAXGMonitor:
 
                     logger.debug(f"Cycle #{cycle_count} - Fetching data...")
                     raw_data = await self.fetch_all_data(api)
-                    self.process_and_write(raw_data)
+                    # 记录时间戳沿用本周期开始时读取的时间，不再重复读时钟
+                    self.process_and_write(raw_data, int(start_time * 1000))
 
                     # 日志摘要
                     ticker = raw_data.get("ticker") or {}
-                    basis_list = raw_data.get("basis") or [{}]
-                    basis = basis_list[0] if basis_list else {}
-                    oi_list = raw_data.get("open_interest_hist") or [{}]
-                    oi = oi_list[0] if oi_list else {}
+                    basis = self._first(raw_data.get("basis")) or {}
+                    oi = self._first(raw_data.get("open_interest_hist")) or {}
 
                     price = ticker.get('lastPrice', 'N/A')
                     basis_val = basis.get('basis', 'N/A')
@@ -417,13 +665,25 @@ class PAXGMonitor:
 
                     # 等待到下一分钟
                     elapsed = time.time() - start_time
-                    sleep_time = max(0, interval_seconds - elapsed)
+                    next_deadline += interval_seconds
+                    now = time.monotonic()
+                    if now - next_deadline > interval_seconds:
+                        # 落后超过一个周期时重新对齐，避免连续补采
+                        next_deadline = now + interval_seconds
+                    sleep_time = max(0, next_deadline - now)
                     logger.debug(f"Cycle #{cycle_count} completed in {elapsed:.2f}s, sleeping {sleep_time:.2f}s")
                     await asyncio.sleep(sleep_time)
 
                 except Exception as e:
                     logger.error(f"Error in cycle #{cycle_count}: {e}", exc_info=True)
                     await asyncio.sleep(5)
+        finally:
+            # 等待 websocket 真正关闭后再关闭 HTTP 会话和输出文件
+            stream_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await stream_task
+            await self.close_session()
+            self.close()
 
 
 async def main():
@@ -453,16 +713,19 @@ async def main():
 
     if args.once:
         logger.info("Running single data collection...")
-        await monitor.run_once()
+        try:
+            await monitor.run_once()
+        finally:
+            await monitor.close_session()
         logger.info(f"Data written to {args.output}/")
-        for name, path in monitor.files.items():
-            if path.exists():
-                with open(path) as f:
-                    last_line = f.readlines()[-1]
-                logger.info(f"{name}.jsonl: {last_line.strip()}")
+        for record_type, line in monitor.last_lines.items():
+            logger.info(f"{record_type}: {line.decode().strip()}")
     else:
         await monitor.run_forever(interval_seconds=args.interval)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
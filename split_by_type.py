@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+将 events.jsonl 按 type 字段拆分回各自的 JSONL 文件
+输出 price.jsonl、basisRate.jsonl 等旧版分文件格式（去掉 type 字段），供下游继续按文件读取
+"""
+
+import argparse
+import io
+import orjson
+import re
+import zstandard
+from pathlib import Path
+
+
+# 轮转文件名 events.<UTC 时间>[-序号].jsonl[.zst]
+ROTATED_NAME = re.compile(r"\.(\d{8}T\d{6}Z)(?:-(\d+))?\.jsonl")
+
+
+def find_event_files(input_dir: Path) -> list[Path]:
+    """按时间顺序列出目录下所有轮转文件（已压缩或尚未压缩），最后是当前的 events.jsonl"""
+    rotated = {}
+    for path in input_dir.glob("events.*.jsonl*"):
+        match = ROTATED_NAME.search(path.name)
+        if match is None or path.suffix not in (".jsonl", ".zst"):
+            continue
+        # 压缩过程中同一轮转文件可能同时存在 .jsonl 和 .zst，只读未压缩的那份
+        key = (match.group(1), int(match.group(2) or 0))
+        if key not in rotated or path.suffix == ".jsonl":
+            rotated[key] = path
+
+    files = [rotated[key] for key in sorted(rotated)]
+    current = input_dir / "events.jsonl"
+    if current.exists():
+        files.append(current)
+    return files
+
+
+def iter_lines(path: Path):
+    """逐行读取 JSONL 文件，支持轮转后 zstd 压缩的 .zst 文件"""
+    with open(path, "rb") as f:
+        if path.suffix == ".zst":
+            yield from io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f))
+        else:
+            yield from f
+
+
+def split_by_type(inputs: list[Path], output_dir: Path, force: bool = False) -> dict:
+    """
+    按 type 字段拆分事件文件
+
+    Args:
+        inputs: 事件文件列表，按给定顺序依次读取
+        output_dir: 输出目录，每个 type 写入 <type>.jsonl
+        force: 输出目录已有 .jsonl 文件时是否覆盖，默认拒绝
+
+    Returns:
+        dict: 每个 type 写出的行数
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    existing = sorted(output_dir.glob("*.jsonl"))
+    if existing and not force:
+        names = ", ".join(path.name for path in existing)
+        raise FileExistsError(f"{output_dir} already contains {names}, use --force to overwrite")
+
+    handles = {}
+    counts = {}
+
+    try:
+        for path in inputs:
+            for line in iter_lines(path):
+                if not line.strip():
+                    continue
+                record = orjson.loads(line)
+                record_type = record.pop("type", None)
+                if record_type is None:
+                    continue
+
+                if record_type not in handles:
+                    handles[record_type] = open(output_dir / f"{record_type}.jsonl", "wb")
+                    counts[record_type] = 0
+                handles[record_type].write(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE))
+                counts[record_type] += 1
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将 events.jsonl 按 type 拆分为各自的 JSONL 文件")
+    parser.add_argument("inputs", nargs="*",
+                        help="事件文件（可包含轮转后的 .zst 文件，按时间顺序给出）；"
+                             "不指定时读取输入目录下全部轮转文件和 events.jsonl")
+    parser.add_argument("-i", "--input-dir", default="binance/paxg-future", help="输入目录")
+    parser.add_argument("-o", "--output", default="binance/paxg-future/split", help="输出目录")
+    parser.add_argument("--force", action="store_true", help="覆盖输出目录中已有的 .jsonl 文件")
+
+    args = parser.parse_args()
+
+    inputs = [Path(p) for p in args.inputs] or find_event_files(Path(args.input_dir))
+    if not inputs:
+        parser.error(f"no event files found in {args.input_dir}")
+
+    try:
+        counts = split_by_type(inputs, Path(args.output), force=args.force)
+    except FileExistsError as e:
+        parser.error(str(e))
+    for record_type, count in counts.items():
+        print(f"{record_type}.jsonl: {count} lines")
+
+
+if __name__ == "__main__":
+    main()